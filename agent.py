@@ -1,5 +1,80 @@
+from collections import deque
+from enum import IntEnum
+
 import numpy as np
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    #Numba is optional; without it the game falls back to vectorized NumPy
+    NUMBA_AVAILABLE = False
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return decorator
+
+class Action(IntEnum):
+    """The two moves of the game; actions are ints everywhere except plot labels."""
+    COOPERATE = 0
+    DEFECT = 1
+
+#Kept as plain ints for the compiled hot path
+COOPERATE = int(Action.COOPERATE)
+DEFECT = int(Action.DEFECT)
+ACTION_NAMES = ('cooperate', 'defect')
+
+#Strategy tags used to dispatch agents inside the compiled game loop
+TIT_FOR_TAT = 0
+RANDOM = 1
+TIT_FOR_TWO_TATS = 2
+GRUDGER = 3
+COOPERATOR = 4
+DEFECTOR = 5
+
+@njit(cache=True)
+def step(strategy_id, my_history, opponent_history, t, rand_draw, grudged):
+    """
+    Choose the next action for a strategy from the pair's action history.
+
+    Parameters
+    ----------
+    strategy_id : int
+        Tag of the strategy to dispatch (TIT_FOR_TAT, RANDOM, ...).
+    my_history : ndarray of int8
+        Actions this agent has taken against the opponent so far.
+    opponent_history : ndarray of int8
+        Actions the opponent has taken against this agent so far.
+    t : int
+        The current round number (0-indexed).
+    rand_draw : int
+        Pre-sampled random action, used by the Random strategy.
+    grudged : int
+        1 if the opponent has ever defected, used by the Grudger strategy.
+
+    Returns
+    -------
+    action : int
+        The chosen action (COOPERATE or DEFECT).
+    """
+    if strategy_id == TIT_FOR_TAT:
+        if t == 0:
+            return COOPERATE
+        return opponent_history[t-1]
+    elif strategy_id == RANDOM:
+        return rand_draw
+    elif strategy_id == TIT_FOR_TWO_TATS:
+        if t >= 2 and opponent_history[t-1] == DEFECT and opponent_history[t-2] == DEFECT:
+            return DEFECT
+        return COOPERATE
+    elif strategy_id == GRUDGER:
+        return DEFECT if grudged else COOPERATE
+    elif strategy_id == COOPERATOR:
+        return COOPERATE
+    return DEFECT
+
 class AgentFactory:
     def __init__(self):
         self.agent_classes = {}
@@ -56,7 +131,6 @@ class Agent:
         self.name = name
         self.history = {}
         self.oponent_history = {}
-        self.score = 0
         self.label = ''
         self.description = ''
     def __str__(self):
@@ -73,8 +147,8 @@ class Agent:
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
         pass
 
@@ -86,30 +160,24 @@ class Agent:
         ----------
         opponent_name : str
             The name of the opponent agent.
-        action : str
-            The action taken ('cooperate' or 'defect').
-        opponent_action : str
-            The action taken by the opponent ('cooperate' or 'defect').
+        action : Action
+            The action taken.
+        opponent_action : Action
+            The action taken by the opponent.
+
+        Notes
+        -----
+        Actions are stored in bytearrays, one byte per round.
         """
         if opponent_name not in self.history:
-            self.history[opponent_name] = []
-            self.oponent_history[opponent_name] = []
+            self.history[opponent_name] = bytearray()
+            self.oponent_history[opponent_name] = bytearray()
         self.history[opponent_name].append(action)
         self.oponent_history[opponent_name].append(oponent_action)
 
-    def update_score(self, payoff):
-        """
-        Update the agent's score based on the payoff.
-
-        Parameters
-        ----------
-        payoff : int
-            The payoff received in the current interaction.
-        """
-        self.score += payoff
-
 @factory.register('TitForTat')
 class TitForTatAgent(Agent):
+    strategy_id = TIT_FOR_TAT
     def __init__(self, name):
         super().__init__(name)
         self.label = 'TFT'
@@ -125,19 +193,22 @@ class TitForTatAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
         if opponent_name in self.history:
-            return self.oponent_history[opponent_name][-1]
-        return 'cooperate'
+            return Action(self.oponent_history[opponent_name][-1])
+        return Action.COOPERATE
 
 @factory.register('Random')
 class RandomAgent(Agent):
+    strategy_id = RANDOM
     def __init__(self, name):
         super().__init__(name)
         self.label = 'R'
         self.description = 'Randomly chooses to cooperate or defect.'
+        self._rng = np.random.default_rng()
+        self._draws = deque()
     def choose_action(self, opponent_name):
         """
         Choose an action based on the opponent's name.
@@ -149,17 +220,40 @@ class RandomAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
-        return np.random.choice(['cooperate', 'defect'])
+        if not self._draws:
+            #Refill in bulk; one RNG call covers many rounds
+            self._draws.extend(self._rng.integers(0, 2, size=256, dtype=np.int8))
+        return Action(self._draws.popleft())
 
 @factory.register('TitForTwoTats')
 class TitForTwoTatsAgent(Agent):
+    strategy_id = TIT_FOR_TWO_TATS
     def __init__(self, name):
         super().__init__(name)
         self.label = 'TF2T'
         self.description = 'Cooperates until the opponent defects twice in a row, then defects.'
+        self._defect_streak = {}
+    def update_history(self, opponent_name, action, oponent_action):
+        """
+        Update the interaction history and the opponent's defect streak.
+
+        Parameters
+        ----------
+        opponent_name : str
+            The name of the opponent agent.
+        action : Action
+            The action taken.
+        opponent_action : Action
+            The action taken by the opponent.
+        """
+        super().update_history(opponent_name, action, oponent_action)
+        if oponent_action == Action.DEFECT:
+            self._defect_streak[opponent_name] = self._defect_streak.get(opponent_name, 0) + 1
+        else:
+            self._defect_streak[opponent_name] = 0
     def choose_action(self, opponent_name):
         """
         Choose an action based on the opponent's name.
@@ -171,21 +265,35 @@ class TitForTwoTatsAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
-        if opponent_name in self.history:
-            if len(self.history[opponent_name]) >= 2:
-                if self.oponent_history[opponent_name][-1] == 'defect' and self.oponent_history[opponent_name][-2] == 'defect':
-                    return 'defect'
-        return 'cooperate'
+        return Action.DEFECT if self._defect_streak.get(opponent_name, 0) >= 2 else Action.COOPERATE
 
 @factory.register('Grudger')
 class GrudgerAgent(Agent):
+    strategy_id = GRUDGER
     def __init__(self, name):
         super().__init__(name)
         self.label = 'G'
         self.description = 'Cooperates until the opponent defects, then defects for the rest of the game.'
+        self._grudge = {}
+    def update_history(self, opponent_name, action, oponent_action):
+        """
+        Update the interaction history and flag opponents that defect.
+
+        Parameters
+        ----------
+        opponent_name : str
+            The name of the opponent agent.
+        action : Action
+            The action taken.
+        opponent_action : Action
+            The action taken by the opponent.
+        """
+        super().update_history(opponent_name, action, oponent_action)
+        if oponent_action == Action.DEFECT:
+            self._grudge[opponent_name] = True
     def choose_action(self, opponent_name):
         """
         Choose an action based on the opponent's name.
@@ -197,16 +305,14 @@ class GrudgerAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
-        if opponent_name in self.history:
-            if 'defect' in self.oponent_history[opponent_name]:
-                return 'defect'
-        return 'cooperate'
+        return Action.DEFECT if self._grudge.get(opponent_name) else Action.COOPERATE
 
 @factory.register('Cooperator')
 class CooperatorAgent(Agent):
+    strategy_id = COOPERATOR
     def __init__(self, name):
         super().__init__(name)
         self.label = 'C'
@@ -222,13 +328,14 @@ class CooperatorAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
-        return 'cooperate'
+        return Action.COOPERATE
 
 @factory.register('Defector')
 class DefectorAgent(Agent):
+    strategy_id = DEFECTOR
     def __init__(self, name):
         super().__init__(name)
         self.label = 'D'
@@ -244,10 +351,10 @@ class DefectorAgent(Agent):
 
         Returns
         -------
-        action : str
-            The chosen action ('cooperate' or 'defect').
+        action : Action
+            The chosen action (Action.COOPERATE or Action.DEFECT).
         """
-        return 'defect'
+        return Action.DEFECT
 
 
 
@@ -1,9 +1,168 @@
 import numpy as np
+import matplotlib
+#Render off-screen; figures are written to games/ rather than shown
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 #MY classes
-from agent import factory
+from agent import (factory, step, njit, NUMBA_AVAILABLE, ACTION_NAMES,
+                   COOPERATE, DEFECT, TIT_FOR_TAT, RANDOM, TIT_FOR_TWO_TATS, GRUDGER, DEFECTOR)
+
+@njit(cache=True)
+def _run_pair(strategy_id1, strategy_id2, rounds, payoff, rand_draws1, rand_draws2):
+    """
+    Play every round between one pair of agents.
+
+    Parameters
+    ----------
+    strategy_id1 : int
+        Strategy tag of the first agent.
+    strategy_id2 : int
+        Strategy tag of the second agent.
+    rounds : int
+        The number of rounds to play.
+    payoff : ndarray of int32, shape (2, 2, 2)
+        payoff[a1, a2] is the payoff pair for actions a1 and a2.
+    rand_draws1 : ndarray of int8
+        Pre-sampled random actions for the first agent.
+    rand_draws2 : ndarray of int8
+        Pre-sampled random actions for the second agent.
+
+    Returns
+    -------
+    tuple
+        The action arrays and total scores of both agents.
+    """
+    actions1 = np.zeros(rounds, dtype=np.int8)
+    actions2 = np.zeros(rounds, dtype=np.int8)
+    score1 = 0
+    score2 = 0
+    #Each flag flips to 1 the first time the other agent defects
+    grudge1 = 0
+    grudge2 = 0
+    for t in range(rounds):
+        action1 = step(strategy_id1, actions1, actions2, t, rand_draws1[t], grudge1)
+        action2 = step(strategy_id2, actions2, actions1, t, rand_draws2[t], grudge2)
+        actions1[t] = action1
+        actions2[t] = action2
+        if action2 == DEFECT:
+            grudge1 = 1
+        if action1 == DEFECT:
+            grudge2 = 1
+        score1 += payoff[action1, action2, 0]
+        score2 += payoff[action1, action2, 1]
+    return actions1, actions2, score1, score2
+
+@njit(cache=True)
+def _run_pairs(strategy_ids1, strategy_ids2, rounds, payoff, rand_draws1, rand_draws2,
+               actions1, actions2, pair_scores):
+    """
+    Play a batch of pairs entirely inside compiled code.
+
+    Parameters
+    ----------
+    strategy_ids1 : ndarray of int8
+        Strategy tag of the first agent of each pair.
+    strategy_ids2 : ndarray of int8
+        Strategy tag of the second agent of each pair.
+    rounds : int
+        The number of rounds to play.
+    payoff : ndarray of int32, shape (2, 2, 2)
+        payoff[a1, a2] is the payoff pair for actions a1 and a2.
+    rand_draws1 : ndarray of int8, shape (pairs, rounds)
+        Pre-sampled random actions for the first agent of each pair.
+    rand_draws2 : ndarray of int8, shape (pairs, rounds)
+        Pre-sampled random actions for the second agent of each pair.
+    actions1 : ndarray of int8, shape (pairs, rounds)
+        Actions of the first agent of each pair, filled in place.
+    actions2 : ndarray of int8, shape (pairs, rounds)
+        Actions of the second agent of each pair, filled in place.
+    pair_scores : ndarray of int64, shape (pairs, 2)
+        Total scores of both agents of each pair, filled in place.
+    """
+    for k in range(strategy_ids1.shape[0]):
+        acts1, acts2, score1, score2 = _run_pair(strategy_ids1[k], strategy_ids2[k], rounds,
+                                                 payoff, rand_draws1[k], rand_draws2[k])
+        actions1[k] = acts1
+        actions2[k] = acts2
+        pair_scores[k, 0] = score1
+        pair_scores[k, 1] = score2
+
+def _run_vectorized(strategy_ids, rounds, payoff, rand_draws):
+    """
+    Play the whole tournament as per-round NumPy array ops over all pairs.
+
+    Every strategy here is a closed-form function of the opponent's prior
+    actions, so one round for all n^2 matchups reduces to a handful of
+    vectorized masks. Used instead of the per-pair loop when numba is not
+    installed and the per-round Python overhead would dominate.
+
+    Parameters
+    ----------
+    strategy_ids : ndarray of int8
+        Strategy tag of each agent.
+    rounds : int
+        The number of rounds to play.
+    payoff : ndarray of int32, shape (2, 2, 2)
+        payoff[a1, a2] is the payoff pair for actions a1 and a2.
+    rand_draws : ndarray of int8, shape (n, n, rounds)
+        Pre-sampled random actions for the Random strategy.
+
+    Returns
+    -------
+    tuple
+        The (n, n, rounds) action array and the int64 score of each agent.
+    """
+    n = strategy_ids.shape[0]
+    actions = np.zeros((n, n, rounds), dtype=np.int8)
+    is_tft = strategy_ids == TIT_FOR_TAT
+    is_random = strategy_ids == RANDOM
+    is_tf2t = strategy_ids == TIT_FOR_TWO_TATS
+    is_grudger = strategy_ids == GRUDGER
+    is_defector = strategy_ids == DEFECTOR
+    #ever_defected[i, j] flips the first time agent j defects against agent i
+    ever_defected = np.zeros((n, n), dtype=bool)
+    for t in range(rounds):
+        next_actions = np.zeros((n, n), dtype=np.int8)
+        if t >= 1:
+            #prev[i, j] is the action agent j took against agent i last round
+            prev = actions[:, :, t-1].T
+            next_actions[is_tft] = prev[is_tft]
+            if t >= 2:
+                prev2 = actions[:, :, t-2].T
+                two_tats = (prev == DEFECT) & (prev2 == DEFECT)
+                next_actions[is_tf2t] = np.where(two_tats[is_tf2t], DEFECT, COOPERATE)
+        next_actions[is_random] = rand_draws[is_random, :, t]
+        next_actions[is_grudger] = np.where(ever_defected[is_grudger], DEFECT, COOPERATE)
+        next_actions[is_defector] = DEFECT
+        actions[:, :, t] = next_actions
+        ever_defected |= next_actions.T == DEFECT
+    #Gather each agent's payoff against every opponent and mask out the diagonal
+    payoffs = payoff[actions, actions.transpose(1, 0, 2), 0]
+    off_diagonal = ~np.eye(n, dtype=bool)
+    scores = (payoffs * off_diagonal[:, :, None]).sum(axis=(1, 2), dtype=np.int64)
+    return actions, scores
+
+def _simulate_pair(spec):
+    """
+    Simulate a single pair from its spec; entry point for pool workers.
+
+    Parameters
+    ----------
+    spec : tuple
+        (i, j, strategy_id1, strategy_id2, rounds, payoff, rand_draws1, rand_draws2).
+
+    Returns
+    -------
+    tuple
+        (i, j, actions1, actions2, score1, score2).
+    """
+    i, j, strategy_id1, strategy_id2, rounds, payoff, rand_draws1, rand_draws2 = spec
+    actions1, actions2, score1, score2 = _run_pair(strategy_id1, strategy_id2, rounds,
+                                                   payoff, rand_draws1, rand_draws2)
+    return i, j, actions1, actions2, score1, score2
 
 class PrisonersDilemma:
     def __init__(self, config, factory):
@@ -18,9 +177,29 @@ class PrisonersDilemma:
             Factory to create agent instances.
         """
         self.agents = [factory.create(agent['type'], agent['name']) for agent in config['agents']]
+        #Names key histories and saved plots; build the lookup once and reject duplicates
+        self.agents_by_name = {agent.name: agent for agent in self.agents}
+        if len(self.agents_by_name) != len(self.agents):
+            raise ValueError("Agent names must be unique.")
         self.payoff_matrix = config['payoff_matrix']
+        #Payoffs as a (2, 2, 2) int array indexed by encoded actions, built once
+        self.payoff = np.array([[self.payoff_matrix[action1][action2] for action2 in ACTION_NAMES]
+                                for action1 in ACTION_NAMES], dtype=np.int32)
         self.rounds = config['rounds']
         self.simulations = config['simulations']
+        self.processes = config.get('processes', 1)
+        self.scores = np.zeros(len(self.agents), dtype=np.int64)
+        self.seed = config.get('seed', 0)
+        #Pre-sample every Random-agent decision, seeded per pair so each pair
+        #simulation is a pure function of (strategies, seed) and runs reproduce exactly
+        n = len(self.agents)
+        self._rand_draws = np.zeros((n, n, self.rounds), dtype=np.int8)
+        for i in range(n):
+            for j in range(i+1, n):
+                rng = np.random.default_rng((i, j, self.seed))
+                draws = rng.integers(0, 2, size=(2, self.rounds), dtype=np.int8)
+                self._rand_draws[i, j] = draws[0]
+                self._rand_draws[j, i] = draws[1]
     def __str__(self):
         """
         
@@ -42,36 +221,15 @@ class PrisonersDilemma:
         
                 
 
-    def play_round(self, agent1, agent2):
-        """
-        Play a round between two agents.
-
-        Parameters
-        ----------
-        agent1 : Agent
-            The first agent.
-        agent2 : Agent
-            The second agent.
-        """
-        action1 = agent1.choose_action(agent2.name)
-        action2 = agent2.choose_action(agent1.name)
-
-        agent1.update_history(agent2.name, action1, action2)
-        agent2.update_history(agent1.name, action2, action1)
-
-        payoff1, payoff2 = self.get_payoffs(action1, action2)
-        agent1.update_score(payoff1)
-        agent2.update_score(payoff2)
-
     def get_payoffs(self, action1, action2):
         """
         Get the payoffs for two actions.
 
         Parameters
         ----------
-        action1 : str
+        action1 : Action
             The action of the first agent.
-        action2 : str
+        action2 : Action
             The action of the second agent.
 
         Returns
@@ -79,56 +237,112 @@ class PrisonersDilemma:
         tuple
             Payoffs for the first and second agents.
         """
-        return self.payoff_matrix[action1][action2]
+        return self.payoff[action1, action2]
 
     def run(self):
         """
         Run the game for the specified number of rounds.
         """
         self.__str__()
-        for _ in range(self.rounds):
-            for i, agent1 in enumerate(self.agents):
-                for agent2 in self.agents[i+1:]:
-                    self.play_round(agent1, agent2)
+        n = len(self.agents)
+        if self.processes == 1 and not NUMBA_AVAILABLE:
+            #Without numba the per-pair loop is interpreted; per-round array ops win instead
+            strategy_ids = np.array([agent.strategy_id for agent in self.agents], dtype=np.int8)
+            self.actions, scores = _run_vectorized(strategy_ids, self.rounds, self.payoff,
+                                                   self._rand_draws)
+        else:
+            self.actions = np.zeros((n, n, self.rounds), dtype=np.int8)
+            scores = np.zeros(n, dtype=np.int64)
+            #Pairs share no state, so they can run in any order or in parallel.
+            #Deterministic matchups with the same strategy pair play out identically,
+            #so each unique pair is simulated once and its transcript reused.
+            specs = []
+            assignments = []
+            transcript_keys = {}
+            for i in range(n):
+                for j in range(i+1, n):
+                    strategy_id1 = self.agents[i].strategy_id
+                    strategy_id2 = self.agents[j].strategy_id
+                    if strategy_id1 == RANDOM or strategy_id2 == RANDOM:
+                        key = None
+                    else:
+                        key = (strategy_id1, strategy_id2)
+                    if key is None or key not in transcript_keys:
+                        if key is not None:
+                            transcript_keys[key] = len(specs)
+                        assignments.append((i, j, len(specs)))
+                        specs.append((i, j, strategy_id1, strategy_id2, self.rounds,
+                                      self.payoff, self._rand_draws[i, j], self._rand_draws[j, i]))
+                    else:
+                        assignments.append((i, j, transcript_keys[key]))
+            if self.processes > 1:
+                with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                    results = list(executor.map(_simulate_pair, specs))
+            else:
+                #Serial path: one compiled call covers every unique pair
+                pairs = len(specs)
+                strategy_ids1 = np.array([spec[2] for spec in specs], dtype=np.int8)
+                strategy_ids2 = np.array([spec[3] for spec in specs], dtype=np.int8)
+                rand_draws1 = np.array([spec[6] for spec in specs], dtype=np.int8).reshape(pairs, self.rounds)
+                rand_draws2 = np.array([spec[7] for spec in specs], dtype=np.int8).reshape(pairs, self.rounds)
+                actions1 = np.zeros((pairs, self.rounds), dtype=np.int8)
+                actions2 = np.zeros((pairs, self.rounds), dtype=np.int8)
+                pair_scores = np.zeros((pairs, 2), dtype=np.int64)
+                _run_pairs(strategy_ids1, strategy_ids2, self.rounds, self.payoff,
+                           rand_draws1, rand_draws2, actions1, actions2, pair_scores)
+                results = [(specs[k][0], specs[k][1], actions1[k], actions2[k],
+                            pair_scores[k, 0], pair_scores[k, 1]) for k in range(pairs)]
+            for i, j, k in assignments:
+                _, _, actions1, actions2, score1, score2 = results[k]
+                self.actions[i, j] = actions1
+                self.actions[j, i] = actions2
+                scores[i] += score1
+                scores[j] += score2
+        self.scores += scores
 
-    def visualize_games(self,save=False):
+    def visualize_games(self,save=False,annotate=None):
         """
         Visualize the history of interactions.
+
+        Parameters
+        ----------
+        save : bool
+            Save the plots to games/ instead of showing them.
+        annotate : bool, optional
+            Label every point with the running score. Text layout is the
+            dominant draw cost, so by default it is skipped for games
+            longer than 50 rounds.
         """
-        
-        for agent in self.agents:
-            for opponent_name, agent_actions in agent.history.items():
-                opponent = next(op for op in self.agents if op.name == opponent_name)
-                opponent_actions = opponent.history[agent.name]
-
-                # Initialize scores
-                agent_scores = [0]
-                opponent_scores = [0]
-
-                # Calculate cumulative scores
-                for i in range(len(agent_actions)):
-                    action1, action2 = agent_actions[i], opponent_actions[i]
-                    payoff1, payoff2 = self.get_payoffs(action1, action2)
-                    agent_scores.append(agent_scores[-1] + payoff1)
-                    opponent_scores.append(opponent_scores[-1] + payoff2)
-
-                rounds = range(len(agent_actions))
-                fig,ax = plt.subplots(figsize=(10, 2))
-
-                # Plot agent's actions
-                agent_colors = ['green' if action == 'cooperate' else 'red' for action in agent_actions]
-                ax.scatter(rounds, [1] * len(agent_actions), c=agent_colors, marker='o', label=f'{agent.name} actions')
-
-                # Plot opponent's actions
-                opponent_colors = ['green' if action == 'cooperate' else 'red' for action in opponent_actions]
-                ax.scatter(rounds, [0] * len(opponent_actions), c=opponent_colors, marker='x', label=f'{opponent_name} actions')
-                
+        if annotate is None:
+            annotate = self.rounds <= 50
+        rounds = np.arange(self.rounds)
+        #Creating a figure per pair dominates save time; reuse one and clear it
+        fig, ax = plt.subplots(figsize=(10, 2))
+        for i, agent in enumerate(self.agents):
+            for j, opponent in enumerate(self.agents):
+                if i == j:
+                    continue
+                opponent_name = opponent.name
+
+                # Calculate cumulative scores with one payoff gather per pair
+                payoffs = self.payoff[self.actions[i, j], self.actions[j, i]]
+                agent_scores = np.cumsum(payoffs[:, 0])
+                opponent_scores = np.cumsum(payoffs[:, 1])
+
+                ax.clear()
+
+                # Plot both agents' actions, one scatter per side
+                agent_colors = np.where(self.actions[i, j] == COOPERATE, 'green', 'red')
+                ax.scatter(rounds, np.ones(self.rounds), c=agent_colors, marker='o', label=f'{agent.name} actions')
+                opponent_colors = np.where(self.actions[j, i] == COOPERATE, 'green', 'red')
+                ax.scatter(rounds, np.zeros(self.rounds), c=opponent_colors, marker='x', label=f'{opponent_name} actions')
+
                 #Label points with the scores at each point
-                for i, txt in enumerate(agent_scores[1:]):
-                    ax.annotate(txt, (rounds[i], 1), fontsize=14, xytext=(0, -15), textcoords='offset points')
-                for i, txt in enumerate(opponent_scores[1:]):
-                    ax.annotate(txt, (rounds[i], 0), fontsize=14, xytext=(0, 15), textcoords='offset points')
-                
+                if annotate:
+                    for k in range(self.rounds):
+                        ax.annotate(agent_scores[k], (k, 1), fontsize=14, xytext=(0, -15), textcoords='offset points')
+                        ax.annotate(opponent_scores[k], (k, 0), fontsize=14, xytext=(0, 15), textcoords='offset points')
+
                 # Add labels, legend, and grid
                 ax.set_yticks([0.2, 0.8], [opponent_name, agent.name])
                 ax.set_xticks([])
@@ -136,15 +350,15 @@ class PrisonersDilemma:
                 ax.set_title(f"{agent.name} ({agent.label}) vs {opponent_name} ({opponent.label})")
                 ax.legend()
                 if save:
-                    plt.savefig(f"games/{agent.name}_vs_{opponent_name}.png")
-                    plt.close(fig)
+                    fig.savefig(f"games/{agent.name}_vs_{opponent_name}.png")
                 else:
                     plt.show()
+        plt.close(fig)
     def visualize_scores(self,save=False):
         """
         Visualize the scores of the agents.
         """
-        scores = [agent.score for agent in self.agents]
+        scores = self.scores
         names_labels = [f'{agent.name} ({agent.label})' for agent in self.agents]
 
         fig,ax = plt.subplots(figsize=(10, 5))